@@ -9,10 +9,19 @@ Features:
 """
 
 import streamlit as st
+import streamlit.components.v1 as components
 import google.generativeai as genai
-from PyPDF2 import PdfReader
-import json
+import diskcache
+import numpy as np
+import orjson
+from pdf_extract import count_pages, extract_pages, iter_page_batches, iter_page_text
+import asyncio
+import hashlib
+import html
 import os
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TypedDict
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -33,19 +42,36 @@ if not API_KEY or API_KEY == 'your_actual_api_key_here':
     st.info("Get your free API key at: https://aistudio.google.com/app/apikey")
     st.stop()
 
+MODEL_NAME = 'gemini-2.5-flash'  # Using Gemini 2.5 Flash for optimal performance
+EMBEDDING_MODEL = 'models/text-embedding-004'  # Used to index document chunks for Q&A retrieval
+MAX_CONCURRENT_REQUESTS = 5  # Cap on parallel embedding calls while ingesting a document
+EMBED_BATCH_SIZE = 32  # Chunks per embedding request while ingesting a document
+SEMANTIC_CACHE_THRESHOLD = 0.92  # Cosine similarity above which a prior answer is reused
+
+
+@st.cache_resource
+def get_model(api_key):
+    """Configure the Gemini SDK and build the model once, shared across sessions and reruns"""
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(MODEL_NAME)
+
+
 try:
-    genai.configure(api_key=API_KEY)
-    MODEL_NAME = 'gemini-2.5-flash'  # Using Gemini 2.5 Flash for optimal performance
-    model = genai.GenerativeModel(MODEL_NAME)
+    model = get_model(API_KEY)
 except Exception as e:
     st.error(f"❌ Error configuring Gemini API: {str(e)}")
     st.stop()
 
 # Custom CSS for polished, modern UI
-# Custom CSS for polished, modern UI
-def load_css(file_name):
+@st.cache_data
+def _read_css(file_name):
+    """Read the stylesheet once instead of on every rerun"""
     with open(file_name) as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+        return f.read()
+
+
+def load_css(file_name):
+    st.markdown(f'<style>{_read_css(file_name)}</style>', unsafe_allow_html=True)
 
 load_css("styles.css")
 
@@ -54,204 +80,853 @@ if 'pdf_text' not in st.session_state:
     st.session_state.pdf_text = None
 if 'filename' not in st.session_state:
     st.session_state.filename = None
+if 'doc_hash' not in st.session_state:
+    st.session_state.doc_hash = None
+if 'doc_index' not in st.session_state:
+    st.session_state.doc_index = None
+if 'index_error' not in st.session_state:
+    st.session_state.index_error = None
+if 'q_embeddings' not in st.session_state:
+    st.session_state.q_embeddings = []
+if 'q_answers' not in st.session_state:
+    st.session_state.q_answers = []
 if 'summary' not in st.session_state:
     st.session_state.summary = None
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 if 'mindmap_data' not in st.session_state:
     st.session_state.mindmap_data = None
+if 'analysis_key' not in st.session_state:
+    st.session_state.analysis_key = None
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _extract_pdf_pages(doc_hash, _pdf_bytes):
+    """
+    Extract per-page text from raw PDF bytes, cached on the document's content hash.
+    
+    Args:
+        doc_hash (str): SHA-256 hex digest of the PDF bytes, used as the cache key
+        _pdf_bytes (bytes): Raw PDF file content (excluded from Streamlit's hashing)
+        
+    Returns:
+        list: Extracted text of each page, in page order (empty for a page-less PDF)
+    """
+    total_pages = count_pages(_pdf_bytes)
+    if total_pages == 0:
+        return []
+    return extract_pages(_pdf_bytes, total_pages)
 
 
-def extract_text_from_pdf(pdf_file):
+def get_doc_hash(pdf_file):
+    """Return the SHA-256 hex digest identifying an uploaded PDF's content"""
+    return hashlib.sha256(pdf_file.getvalue()).hexdigest()
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def extract_pdf_preview(doc_hash, _pdf_bytes, max_chars=8000):
+    """
+    Extract the start of the document, decoding only as many pages as needed.
+    
+    Pages are joined exactly as in pages_to_text(), so the preview is
+    a prefix of the full text. Cached on the content hash, so re-uploads
+    skip decoding entirely.
+    
+    Args:
+        doc_hash (str): Content hash of the PDF from get_doc_hash(), used as the cache key
+        _pdf_bytes (bytes): Raw PDF file content (excluded from Streamlit's hashing)
+        max_chars (int): Stop once at least this many characters are available
+        
+    Returns:
+        str: Leading document text (empty if nothing could be extracted)
+    """
+    parts = []
+    total = 0
+    for page_text in iter_page_text(_pdf_bytes):
+        if page_text:
+            total += len(page_text) + (1 if parts else 0)
+            parts.append(page_text)
+        if total >= max_chars:
+            break
+    return "\n".join(parts)
+
+
+def pages_to_text(pages):
+    """
+    Join extracted page text into the document text, warning when there is none.
+    
+    Args:
+        pages (list): Extracted text of each page, in page order
+        
+    Returns:
+        str: Document text, or None if the PDF is empty or has no extractable text
+    """
+    if not pages:
+        st.warning("⚠️ PDF appears to be empty.")
+        return None
+        
+    parts = [page_text for page_text in pages if page_text]
+    
+    text = "\n".join(parts)
+    if not text.strip():
+        st.warning("⚠️ Could not extract text from PDF. It may be image-based or encrypted.")
+        return None
+        
+    return text
+
+
+def extract_text_from_pdf(pdf_file, doc_hash):
     """
     Extract text content from uploaded PDF file.
     
+    Identical uploads are served from cache instead of being parsed again.
+    
     Args:
         pdf_file: Uploaded PDF file object from Streamlit file_uploader
+        doc_hash (str): Content hash of the PDF from get_doc_hash()
         
     Returns:
         str: Extracted text content from all pages, or None if extraction fails
     """
     try:
-        pdf_reader = PdfReader(pdf_file)
-        text = ""
-        total_pages = len(pdf_reader.pages)
-        
-        if total_pages == 0:
-            st.warning("⚠️ PDF appears to be empty.")
-            return None
-            
-        for page in pdf_reader.pages:
-            extracted = page.extract_text()
-            if extracted:
-                text += extracted + "\n"
-                
-        if not text.strip():
-            st.warning("⚠️ Could not extract text from PDF. It may be image-based or encrypted.")
-            return None
-            
-        return text
+        return pages_to_text(_extract_pdf_pages(doc_hash, pdf_file.getvalue()))
     except Exception as e:
         st.error(f"❌ Error extracting text from PDF: {str(e)}")
         return None
 
 
-def generate_summary(text):
+def iter_chunks(words, chunk_chars=2000):
     """
-    Generate comprehensive document summary using Gemini LLM.
+    Group a stream of words into chunks for embedding.
     
-    AI Task: Text Summarization
-    AI Method: Large Language Models (Gemini 2.5 Flash)
+    Args:
+        words (iterable): Words of the document, in order
+        chunk_chars (int): Approximate chunk size in characters (~500 tokens by default)
+        
+    Yields:
+        str: Each chunk as soon as it is complete
+    """
+    current = []
+    size = 0
+    for word in words:
+        if current and size + len(word) > chunk_chars:
+            yield " ".join(current)
+            current = []
+            size = 0
+        current.append(word)
+        size += len(word) + 1
+    if current:
+        yield " ".join(current)
+
+
+def split_into_chunks(text, chunk_chars=2000):
+    """
+    Split document text into word-aligned chunks for embedding.
     
     Args:
-        text (str): Full document text to summarize
+        text (str): Full document text
+        chunk_chars (int): Approximate chunk size in characters (~500 tokens by default)
         
     Returns:
-        str: Generated summary with main topic and key points, or None if generation fails
+        list: Chunks of text, in document order
     """
-    try:
-        # Limit text to ~8000 characters to stay within token limits
-        text_chunk = text[:8000] if len(text) > 8000 else text
-        
-        prompt = f"""
-        You are an expert document analyst. Please provide a comprehensive summary of the following document.
+    return list(iter_chunks(text.split(), chunk_chars))
+
+
+def to_unit_rows(vectors):
+    """Stack embeddings into a float32 matrix of unit-length rows, so retrieval is a plain dot product"""
+    embeddings = np.asarray(vectors, dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _build_doc_index(doc_hash, _text):
+    """Embed every chunk of the document in one batched call, cached per document"""
+    chunks = split_into_chunks(_text)
+    result = genai.embed_content(model=EMBEDDING_MODEL, content=chunks, task_type="retrieval_document")
+    return chunks, to_unit_rows(result["embedding"])
+
+
+def index_document(text, doc_hash):
+    """
+    Build the retrieval index used to pick relevant passages for Q&A.
+    
+    Args:
+        text (str): Full document text
+        doc_hash (str): Content hash of the source PDF, used as the cache key
         
-        Instructions:
-        - Identify the main topic/theme
-        - List 5-8 key points with detailed explanations
-        - Keep it comprehensive and informative (500-700 words)
-        - Use bullet points for clarity
+    Returns:
+        tuple: (doc_index, error) where doc_index is (chunks, embeddings) with one
+            unit-length float32 row per chunk, or None with the error message if embedding fails
+    """
+    try:
+        return _build_doc_index(doc_hash, text), None
+    except Exception as e:
+        return None, str(e)
+
+
+class IndexUnavailable(Exception):
+    """Raised when a document's text was extracted but its chunks could not be embedded"""
+    
+    def __init__(self, pages, error):
+        super().__init__(str(error))
+        self.pages = pages
+
+
+async def _ingest_pipeline(pdf_bytes, total_pages):
+    """
+    Extract and embed a document with the two stages overlapped.
+    
+    A worker thread decodes page ranges and chunks them as they arrive,
+    handing batches of chunks to the event loop, which embeds each batch
+    while later pages are still being extracted. Embedding uses the sync
+    client in worker threads: the SDK's async client is bound to the first
+    event loop that uses it, and every asyncio.run() creates a new one.
+    
+    After the first embedding error no further batches are sent, but
+    extraction carries on so the text is still available.
+    
+    Returns:
+        tuple: (pages, chunks, embeddings, embed_error) where embeddings is None
+            and embed_error is the first exception if embedding failed
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    pages = []
+    
+    def words():
+        for page_batch in iter_page_batches(pdf_bytes, total_pages):
+            pages.extend(page_batch)
+            for page_text in page_batch:
+                yield from page_text.split()
+    
+    def produce():
+        try:
+            batch = []
+            for chunk in iter_chunks(words()):
+                batch.append(chunk)
+                if len(batch) == EMBED_BATCH_SIZE:
+                    loop.call_soon_threadsafe(queue.put_nowait, batch)
+                    batch = []
+            if batch:
+                loop.call_soon_threadsafe(queue.put_nowait, batch)
+        finally:
+            # Always release the consumer, even if extraction fails
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+    
+    embed_errors = []
+    
+    async def embed(batch):
+        try:
+            async with semaphore:
+                result = await asyncio.to_thread(
+                    genai.embed_content, model=EMBEDDING_MODEL, content=batch, task_type="retrieval_document"
+                )
+            return result["embedding"]
+        except Exception as e:
+            embed_errors.append(e)
+            return None
+    
+    producer = asyncio.create_task(asyncio.to_thread(produce))
+    chunks = []
+    requests = []
+    while (batch := await queue.get()) is not None:
+        chunks.extend(batch)
+        if not embed_errors:
+            requests.append(asyncio.create_task(embed(batch)))
+    
+    try:
+        await producer
+        results = await asyncio.gather(*requests)
+    except BaseException:
+        for request in requests:
+            request.cancel()
+        raise
+    
+    if embed_errors:
+        return pages, chunks, None, embed_errors[0]
+    return pages, chunks, [vector for batch_vectors in results for vector in batch_vectors], None
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _ingest_cached(doc_hash, _pdf_bytes):
+    """
+    Run the ingest pipeline once per document; failures raise and are not cached.
+    
+    Raises:
+        IndexUnavailable: If only embedding failed; carries the extracted pages
+    """
+    total_pages = count_pages(_pdf_bytes)
+    if total_pages == 0:
+        return [], None
+    
+    pages, chunks, vectors, embed_error = asyncio.run(_ingest_pipeline(_pdf_bytes, total_pages))
+    if embed_error is not None:
+        raise IndexUnavailable(pages, embed_error)
+    doc_index = (chunks, to_unit_rows(vectors)) if chunks else None
+    return pages, doc_index
+
+
+def ingest_pdf(pdf_file, doc_hash):
+    """
+    Extract the document text and build its retrieval index in one pipelined pass.
+    
+    If only embedding fails, the extracted text is kept and Q&A falls back
+    to the document prefix. If extraction fails, it is retried step by step.
+    
+    Args:
+        pdf_file: Uploaded PDF file object from Streamlit file_uploader
+        doc_hash (str): Content hash of the PDF from get_doc_hash()
         
-        Document:
-        {text_chunk}
+    Returns:
+        tuple: (text, doc_index, index_error) where text is None if extraction fails,
+            doc_index is None if the document could not be indexed, and index_error
+            explains why
+    """
+    try:
+        pages, doc_index = _ingest_cached(doc_hash, pdf_file.getvalue())
+    except IndexUnavailable as e:
+        return pages_to_text(e.pages), None, str(e)
+    except Exception as e:
+        st.warning(f"⚠️ Fast document processing failed, retrying step by step: {str(e)}")
+        text = extract_text_from_pdf(pdf_file, doc_hash)
+        if not text:
+            return None, None, None
+        return (text, *index_document(text, doc_hash))
+    
+    return pages_to_text(pages), doc_index, None
+
+
+def embed_query(question):
+    """Embed a question as a unit-length float32 vector for retrieval"""
+    result = genai.embed_content(model=EMBEDDING_MODEL, content=question, task_type="retrieval_query")
+    query = np.asarray(result["embedding"], dtype=np.float32)
+    return query / np.linalg.norm(query)
+
+
+def retrieve_context(text, doc_index, query, top_k=5):
+    """
+    Select the document passages most relevant to a question.
+    
+    Args:
+        text (str): Full document text, used when there is no index
+        doc_index (tuple): Index from index_document(), or None
+        query (np.ndarray): Question embedding from embed_query(), or None without an index
+        top_k (int): Number of passages to return
         
-        Summary:
-        """
+    Returns:
+        str: Top-k passages in document order, or the first 8000 characters without an index
+    """
+    if doc_index is None:
+        return text[:8000]
+    
+    chunks, embeddings = doc_index
+    scores = embeddings @ query
+    
+    top_k = min(top_k, len(chunks))
+    best = np.sort(np.argpartition(-scores, top_k - 1)[:top_k])
+    return "\n\n".join(chunks[i] for i in best)
+
+
+def find_similar_answer(query):
+    """
+    Look up the answer to a previously asked question that means the same thing.
+    
+    Args:
+        query (np.ndarray): Question embedding from embed_query()
         
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        st.error(f"❌ Error generating summary: {str(e)}")
+    Returns:
+        str: Cached answer to the most similar prior question, or None below the threshold
+    """
+    if not st.session_state.q_embeddings:
         return None
+    sims = np.stack(st.session_state.q_embeddings) @ query
+    best = int(np.argmax(sims))
+    if sims[best] > SEMANTIC_CACHE_THRESHOLD:
+        return st.session_state.q_answers[best]
+    return None
+
+
+def remember_answer(query, answer):
+    """Add a question embedding and its answer to the session's semantic cache"""
+    st.session_state.q_embeddings.append(query)
+    st.session_state.q_answers.append(answer)
 
 
-def answer_question(text, question):
+def to_chat_html(message):
+    """Escape a chat message for embedding in a chat bubble, keeping line breaks"""
+    return html.escape(message).replace('\n', '<br>')
+
+
+def llm_cache_key(doc_hash, prompt):
+    """Build the response cache key for a prompt issued against a document"""
+    return hashlib.blake2b((doc_hash + prompt).encode()).hexdigest()
+
+
+@st.cache_resource
+def get_answer_store():
+    """Open the on-disk Q&A answer store once, shared across sessions and reruns"""
+    return diskcache.Cache(".llm_cache")
+
+
+class MindmapLeaf(TypedDict):
+    name: str
+
+
+class MindmapBranch(TypedDict):
+    name: str
+    children: list[MindmapLeaf]
+
+
+class Mindmap(TypedDict):
+    name: str
+    children: list[MindmapBranch]
+
+
+class DocumentAnalysis(TypedDict):
+    summary: str
+    mindmap: Mindmap
+
+
+# Constrain Gemini to emit JSON matching DocumentAnalysis
+ANALYSIS_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=DocumentAnalysis
+)
+
+
+# Fenced or bare JSON object, matched in a single pass
+_JSON_RE = re.compile(r"```(?:json)?\s*(\{.*\})\s*```|(\{.*\})", re.S)
+
+
+def _extract_json(response_text):
+    """Strip an optional Markdown code fence from around a JSON payload"""
+    match = _JSON_RE.search(response_text)
+    if match:
+        return match.group(1) or match.group(2)
+    return response_text
+
+
+def request_analysis(prompt):
+    """Call Gemini for the document analysis and parse the JSON reply (no Streamlit calls)"""
+    response = model.generate_content(prompt, generation_config=ANALYSIS_CONFIG)
+    # JSON mode normally returns the bare object; the regex only guards against stray fences
+    return orjson.loads(_extract_json(response.text))
+
+
+@st.cache_resource
+def get_background_executor():
+    """Bounded worker pool for speculative Gemini calls made ahead of user clicks"""
+    return ThreadPoolExecutor(max_workers=4)
+
+
+@st.cache_resource
+def get_analysis_store():
+    """Analysis Futures by cache key, shared across sessions so in-flight requests are reused too"""
+    return {}
+
+
+def _is_reusable(future):
+    """Whether a stored analysis Future has succeeded or may still succeed"""
+    if not future.done():
+        return True
+    return not future.cancelled() and future.exception() is None
+
+
+def request_analysis_once(cache_key, prompt, background=True, max_entries=256):
+    """
+    Return the Future for a document analysis, only calling Gemini if there is none.
+    
+    Failed analyses are not reused, so a later request retries them. Speculative
+    requests run on the background pool; user-initiated ones run on the calling
+    thread, so a click never queues behind other sessions' pre-warms.
+    
+    Args:
+        cache_key (str): Key from llm_cache_key() for the analysis prompt
+        prompt (str): Prompt from build_analysis_prompt()
+        background (bool): Submit to the background pool instead of calling Gemini now
+        max_entries (int): Oldest analyses are dropped beyond this many
+        
+    Returns:
+        tuple: (future, created) where future resolves to the parsed analysis dict
+            and created is False if an existing request was reused
+    """
+    store = get_analysis_store()
+    future = store.get(cache_key)
+    if future is not None and _is_reusable(future):
+        # A click takes over a pre-warm that is still queued rather than waiting for a free worker
+        if background or future.running() or future.done() or not future.cancel():
+            return future, False
+    
+    if background:
+        future = get_background_executor().submit(request_analysis, prompt)
+    else:
+        future = Future()
+        future.set_running_or_notify_cancel()
+    store[cache_key] = future
+    while len(store) > max_entries:
+        store.pop(next(iter(store)), None)
+    
+    if not background:
+        try:
+            future.set_result(request_analysis(prompt))
+        except Exception as e:
+            future.set_exception(e)
+    return future, True
+
+
+def build_qa_prompt(context, question):
+    """Build the Q&A prompt for a question about the retrieved document passages"""
+    return f"""
+    You are an expert document analyst. Answer the following question based ONLY on the document content below.
+    
+    Instructions:
+    - Provide accurate, factual answers
+    - Quote relevant parts if helpful
+    - If the answer is not in the document, say "I cannot find this information in the document."
+    - Be concise but complete
+    
+    Document:
+    {context}
+    
+    Question: {question}
+    
+    Answer:
+    """
+
+
+def answer_question(text, doc_index, doc_hash, question):
     """
     Answer user questions about document content using Gemini LLM.
     
     AI Task: Question Answering with Information Extraction
     AI Method: Large Language Models (Gemini 2.5 Flash)
     
+    Only the passages most relevant to the question are sent to the model.
+    The answer is streamed as it is generated and stored in the on-disk
+    answer store once complete, so repeated questions are served without
+    calling Gemini. Rephrasings of an earlier question in the session are
+    answered from the semantic cache.
+    
     Args:
         text (str): Document text to query
+        doc_index (tuple): Retrieval index from index_document(), or None
+        doc_hash (str): Content hash of the source PDF, used for response caching
         question (str): User's question about the document
         
-    Returns:
-        str: Generated answer based on document content, or None if generation fails
+    Yields:
+        str: Chunks of the generated answer
+        
+    Raises:
+        Exception: If generation fails part-way; the error has already been shown
     """
     try:
-        # Limit text to ~8000 characters for context window
-        text_chunk = text[:8000] if len(text) > 8000 else text
-        
-        prompt = f"""
-        You are an expert document analyst. Answer the following question based ONLY on the document content below.
-        
-        Instructions:
-        - Provide accurate, factual answers
-        - Quote relevant parts if helpful
-        - If the answer is not in the document, say "I cannot find this information in the document."
-        - Be concise but complete
-        
-        Document:
-        {text_chunk}
+        # Without an index there is no embedding model to compare questions with
+        query = embed_query(question) if doc_index is not None else None
+        if query is not None:
+            answer = find_similar_answer(query)
+            if answer is not None:
+                yield answer
+                return
         
-        Question: {question}
-        
-        Answer:
-        """
+        prompt = build_qa_prompt(retrieve_context(text, doc_index, query), question)
+        cache_key = llm_cache_key(doc_hash, prompt)
+        store = get_answer_store()
+        answer = store.get(cache_key)
+        if answer is None:
+            parts = []
+            for chunk in model.generate_content(prompt, stream=True):
+                parts.append(chunk.text)
+                yield chunk.text
+            answer = "".join(parts)
+            store.set(cache_key, answer)
+        else:
+            yield answer
         
-        response = model.generate_content(prompt)
-        return response.text
+        if query is not None:
+            remember_answer(query, answer)
     except Exception as e:
         st.error(f"❌ Error answering question: {str(e)}")
-        return None
+        # Re-raise so the caller knows the streamed text is incomplete
+        raise
 
 
-def generate_mindmap_data(text):
-    """Generate mind map data structure using Gemini LLM"""
-    try:
-        prompt = f"""
-        You are an expert at extracting knowledge structures from documents.
-        
-        Analyze the following document and extract a hierarchical mind map structure.
-        
-        Return ONLY valid JSON in this exact format (Tree Structure):
-        {{
-            "name": "Central Topic",
-            "children": [
-                {{
-                    "name": "Main Concept 1",
-                    "children": [
-                        {{"name": "Sub-concept A"}},
-                        {{"name": "Sub-concept B"}}
-                    ]
-                }},
-                {{
-                    "name": "Main Concept 2",
-                    "children": [
-                        {{"name": "Sub-concept C"}}
-                    ]
-                }}
-            ]
-        }}
-        
-        Rules:
-        - Root node should be the main document title or central theme
-        - Create 3-5 main branches (level 1)
-        - Each main branch should have 2-4 sub-branches (level 2)
-        - Keep labels concise (2-5 words max)
-        
-        Document:
-        {text[:6000]}
-        
-        JSON:
-        """
-        
-        response = model.generate_content(prompt)
-        
-        # Extract JSON from response
-        response_text = response.text.strip()
-        
-        # Try to find JSON in the response
-        if "```json" in response_text:
-            json_start = response_text.find("```json") + 7
-            json_end = response_text.find("```", json_start)
-            json_str = response_text[json_start:json_end].strip()
-        elif "```" in response_text:
-            json_start = response_text.find("```") + 3
-            json_end = response_text.find("```", json_start)
-            json_str = response_text[json_start:json_end].strip()
-        else:
-            json_str = response_text
+def build_analysis_prompt(text):
+    """Build the combined summary + mind map prompt for the document text"""
+    # Limit text to ~8000 characters to stay within token limits
+    text_chunk = text[:8000] if len(text) > 8000 else text
+    
+    return f"""
+    You are an expert document analyst. Analyze the following document and return a JSON object
+    with two fields: "summary" and "mindmap".
+    
+    "summary" instructions:
+    - Provide a comprehensive summary of the document as Markdown
+    - Identify the main topic/theme
+    - List 5-8 key points with detailed explanations
+    - Keep it comprehensive and informative (500-700 words)
+    - Use bullet points for clarity
+    
+    "mindmap" instructions - a hierarchical mind map in this exact format (Tree Structure):
+    {{
+        "name": "Central Topic",
+        "children": [
+            {{
+                "name": "Main Concept 1",
+                "children": [
+                    {{"name": "Sub-concept A"}},
+                    {{"name": "Sub-concept B"}}
+                ]
+            }},
+            {{
+                "name": "Main Concept 2",
+                "children": [
+                    {{"name": "Sub-concept C"}}
+                ]
+            }}
+        ]
+    }}
+    - Root node should be the main document title or central theme
+    - Create 3-5 main branches (level 1)
+    - Each main branch should have 2-4 sub-branches (level 2)
+    - Keep labels concise (2-5 words max)
+    
+    Document:
+    {text_chunk}
+    
+    JSON:
+    """
+
+
+def generate_combined(text, doc_hash):
+    """
+    Generate the document summary and mind map in a single Gemini call.
+    
+    AI Task: Text Summarization and Knowledge Structure Extraction
+    AI Method: Large Language Models (Gemini 2.5 Flash) with JSON-constrained output
+    
+    Args:
+        text (str): Full document text to analyze
+        doc_hash (str): Content hash of the source PDF, used for response caching
         
-        mindmap_data = json.loads(json_str)
-        return mindmap_data
+    Returns:
+        tuple: (summary, mindmap_data) where summary is a Markdown string and
+            mindmap_data is a tree of {"name", "children"} nodes, or None if generation fails
+    """
+    try:
+        prompt = build_analysis_prompt(text)
+        future, _ = request_analysis_once(llm_cache_key(doc_hash, prompt), prompt, background=False)
+        analysis = future.result()
+        return analysis["summary"], analysis["mindmap"]
         
-    except json.JSONDecodeError as e:
-        st.error(f"Error parsing mind map data: {str(e)}")
-        st.error(f"Response was: {response_text}")
+    except orjson.JSONDecodeError as e:
+        st.error(f"Error parsing document analysis: {str(e)}")
+        st.error(f"Response was: {e.doc}")
         return None
     except Exception as e:
-        st.error(f"Error generating mind map: {str(e)}")
+        st.error(f"❌ Error analyzing document: {str(e)}")
         return None
 
 
+def prewarm_analysis(text, doc_hash):
+    """
+    Start generating the summary and mind map in the background.
+    
+    Users nearly always ask for the summary right after uploading, so the
+    request is issued speculatively while they are still looking at the page.
+    Nothing is sent if this document's analysis is already stored or in
+    flight. The worker thread makes no Streamlit calls; its result is moved
+    into session state by collect_prewarmed_analysis().
+    
+    Args:
+        text (str): Full document text to analyze
+        doc_hash (str): Content hash of the source PDF, used for response caching
+        
+    Returns:
+        tuple: (cache_key, future) where cache_key locates the analysis in the shared
+            store and future is the request this call submitted, or None if it
+            reused one that other sessions may depend on
+    """
+    prompt = build_analysis_prompt(text)
+    cache_key = llm_cache_key(doc_hash, prompt)
+    future, created = request_analysis_once(cache_key, prompt)
+    return cache_key, (future if created else None)
+
+
+def discard_analysis(cache_key, future):
+    """Drop an analysis this session submitted, cancelling it if it has not started yet"""
+    store = get_analysis_store()
+    # Leave the entry alone if it has since been replaced by another request
+    if store.get(cache_key) is future:
+        store.pop(cache_key, None)
+    future.cancel()
+
+
+def collect_prewarmed_analysis():
+    """Move a finished background analysis into session state, leaving unfinished ones for a later rerun"""
+    cache_key = st.session_state.analysis_key
+    if cache_key is None:
+        return
+    future = get_analysis_store().get(cache_key)
+    if future is not None and not future.done():
+        return
+    
+    st.session_state.analysis_key = None
+    if future is None:
+        # Evicted from the store; the buttons will request it again
+        return
+    try:
+        analysis = future.result()
+        st.session_state.summary = analysis["summary"]
+        st.session_state.mindmap_data = analysis["mindmap"]
+    except Exception:
+        # Speculative work only; the buttons fall back to generate_combined()
+        pass
+
+
+# D3.js mind map page, split around the data script to avoid f-string brace escaping issues with CSS/JS
+D3_HEAD = '''
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <script src="https://d3js.org/d3.v7.min.js"></script>
+        <style>
+            body { margin: 0; overflow: hidden; }
+            svg { background-color: #ffffff; width: 100vw; height: 100vh; }
+            .node rect {
+                stroke: #fff;
+                stroke-width: 2px;
+                cursor: pointer;
+                filter: drop-shadow(0 3px 3px rgba(0,0,0,0.1));
+                transition: all 0.3s;
+            }
+            .node:hover rect {
+                filter: drop-shadow(0 5px 8px rgba(0,0,0,0.2));
+                transform: scale(1.02);
+            }
+            .node text {
+                font-family: 'Inter', sans-serif;
+                font-size: 12px;
+                pointer-events: none;
+                alignment-baseline: middle;
+                font-weight: 500;
+                fill: #333;
+            }
+            .link {
+                fill: none;
+                stroke: #cbd5e1;
+                stroke-width: 1.5px;
+            }
+        </style>
+    </head>
+    <body>
+        <svg id="mindmap"></svg>
+        <script>
+    '''
+
+D3_TAIL = '''
+            const width = window.innerWidth;
+            
+            // Pastel Color Scale
+            const colors = ["#e0f2fe", "#f0fdf4", "#fef3c7", "#fce7f3", "#ede9fe"];
+
+            // Process Data for Hierarchy
+            const root = d3.hierarchy(data);
+            
+            // Dynamic Height Calculation based on leaf nodes
+            const leaves = root.leaves().length;
+            const nodeHeight = 60;
+            const height = Math.max(600, leaves * nodeHeight);
+            
+            const svg = d3.select("#mindmap")
+                .attr("width", width)
+                .attr("height", height);
+                
+            const g = svg.append("g");
+            
+            // Zoom behavior
+            const zoom = d3.zoom()
+                .scaleExtent([0.1, 4])
+                .on("zoom", (event) => {
+                    g.attr("transform", event.transform);
+                });
+                
+            svg.call(zoom);
+            
+            // Tree Layout
+            const tree = d3.tree()
+                .size([height - 100, width - 400]); // Increased horizontal padding
+                
+            tree(root);
+            
+            // Links
+            const link = g.selectAll(".link")
+                .data(root.links())
+                .join("path")
+                .attr("class", "link")
+                .attr("d", d3.linkHorizontal()
+                    .x(d => d.y)
+                    .y(d => d.x));
+                    
+            // Nodes
+            const node = g.selectAll(".node")
+                .data(root.descendants())
+                .join("g")
+                .attr("class", "node")
+                .attr("transform", d => `translate(${d.y},${d.x})`);
+                
+            // Node Rectangles
+            node.append("rect")
+                .attr("rx", 6)
+                .attr("ry", 6)
+                .attr("width", d => Math.max(120, d.data.name.length * 8))
+                .attr("height", 36)
+                .attr("y", -18)
+                .attr("fill", d => {
+                    if (!d.depth) return "#e0e7ff"; // Root
+                    return colors[d.depth % colors.length];
+                });
+                
+            // Node Text
+            node.append("text")
+                .attr("dy", 1)
+                .attr("x", 10)
+                .text(d => d.data.name);
+                
+            // Center the tree initially
+            const initialScale = 0.8;
+            const bbox = g.node().getBBox();
+            const initialTranslate = [
+                50,
+                (height - bbox.height * initialScale) / 2 - bbox.y * initialScale
+            ];
+            
+            svg.call(zoom.transform, d3.zoomIdentity
+                .translate(initialTranslate[0], initialTranslate[1])
+                .scale(initialScale));
+                
+        </script>
+    </body>
+    </html>
+    '''
+
+
+def build_mindmap_html(mindmap_data):
+    """Splice mind map data into the static D3.js page"""
+    return D3_HEAD + f"const data = {orjson.dumps(mindmap_data).decode()};" + D3_TAIL
+
+
 # Main App Logic
 if st.session_state.pdf_text:
     # ------------------------------------------------------------------------
     # APPLICATION VIEW (File Loaded)
     # ------------------------------------------------------------------------
     
+    # Pick up the background summary if it finished since the last rerun
+    collect_prewarmed_analysis()
+    
     # Sidebar
     with st.sidebar:
         st.title("🧠 DocuMind")
@@ -267,9 +942,15 @@ if st.session_state.pdf_text:
             # Reset state to go back to landing page
             st.session_state.pdf_text = None
             st.session_state.filename = None
+            st.session_state.doc_hash = None
+            st.session_state.doc_index = None
+            st.session_state.index_error = None
+            st.session_state.q_embeddings = []
+            st.session_state.q_answers = []
             st.session_state.summary = None
             st.session_state.chat_history = []
             st.session_state.mindmap_data = None
+            st.session_state.analysis_key = None
             st.rerun()
             
         st.markdown("---")
@@ -301,9 +982,14 @@ if st.session_state.pdf_text:
         
         if st.button("✨ Generate Smart Summary", type="primary"):
             with st.spinner("🤖 Analyzing document structure and key points..."):
-                summary = generate_summary(st.session_state.pdf_text)
-                if summary:
-                    st.session_state.summary = summary
+                collect_prewarmed_analysis()
+                if not st.session_state.summary:
+                    # generate_combined() waits for a running pre-warm rather than issuing a second request
+                    st.session_state.analysis_key = None
+                    analysis = generate_combined(st.session_state.pdf_text, st.session_state.doc_hash)
+                    if analysis:
+                        # The mind map arrives in the same response, so the Mind Map tab can reuse it
+                        st.session_state.summary, st.session_state.mindmap_data = analysis
         
         if st.session_state.summary:
             st.markdown("---")
@@ -321,6 +1007,10 @@ if st.session_state.pdf_text:
     with tab2:
         st.markdown("### 💬 Ask Questions")
         st.markdown("Chat with your document using AI")
+        if st.session_state.index_error:
+            st.warning(
+                f"⚠️ Could not index document, Q&A will only see its beginning: {st.session_state.index_error}"
+            )
         st.markdown("")
         
         # Chat container with scrollable area
@@ -330,16 +1020,11 @@ if st.session_state.pdf_text:
         with chat_container:
             if st.session_state.chat_history:
                 for i, qa in enumerate(st.session_state.chat_history):
-                    # Escape HTML in messages to prevent injection
-                    import html
-                    safe_question = html.escape(qa['question']).replace('\n', '<br>')
-                    safe_answer = html.escape(qa['answer']).replace('\n', '<br>')
-                    
                     # User message (question) on the right
                     st.markdown(f"""
                     <div class="chat-message user-message">
                         <div class="message-bubble user-bubble">
-                            {safe_question}
+                            {qa['question_html']}
                         </div>
                         <div class="message-avatar user-avatar">👤</div>
                     </div>
@@ -350,7 +1035,7 @@ if st.session_state.pdf_text:
                     <div class="chat-message ai-message">
                         <div class="message-avatar ai-avatar">🤖</div>
                         <div class="message-bubble ai-bubble">
-                            {safe_answer}
+                            {qa['answer_html']}
                         </div>
                     </div>
                     """, unsafe_allow_html=True)
@@ -387,15 +1072,30 @@ if st.session_state.pdf_text:
         
         # Handle question submission
         if ask_button and question:
-            with spinner_placeholder:
+            with spinner_placeholder.container():
                 with st.spinner("Thinking..."):
-                    answer = answer_question(st.session_state.pdf_text, question)
-                    if answer:
-                        st.session_state.chat_history.append({
-                            "question": question,
-                            "answer": answer
-                        })
-                        st.rerun()
+                    try:
+                        # Render tokens as they arrive; the chat bubble replaces this on rerun
+                        answer = st.write_stream(
+                            answer_question(
+                                st.session_state.pdf_text,
+                                st.session_state.doc_index,
+                                st.session_state.doc_hash,
+                                question
+                            )
+                        )
+                    except Exception:
+                        # Already reported by answer_question; don't keep a truncated answer
+                        answer = None
+            if answer:
+                # Escape HTML once here, not on every rerun, to prevent injection
+                st.session_state.chat_history.append({
+                    "question": question,
+                    "answer": answer,
+                    "question_html": to_chat_html(question),
+                    "answer_html": to_chat_html(answer)
+                })
+                st.rerun()
 
     # Tab 3: Mind Map
     with tab3:
@@ -403,149 +1103,18 @@ if st.session_state.pdf_text:
         
         if st.button("🗺️ Generate Visual Graph", type="primary"):
             with st.spinner("🧠 Extracting concepts and relationships..."):
-                mindmap_data = generate_mindmap_data(st.session_state.pdf_text)
-                if mindmap_data:
-                    st.session_state.mindmap_data = mindmap_data
+                collect_prewarmed_analysis()
+                if not st.session_state.mindmap_data:
+                    st.session_state.analysis_key = None
+                    analysis = generate_combined(st.session_state.pdf_text, st.session_state.doc_hash)
+                    if analysis:
+                        st.session_state.summary, st.session_state.mindmap_data = analysis
         
         if st.session_state.mindmap_data:
             st.markdown("### 🎨 Interactive Mind Map")
             
-            # D3.js visualization (Same code as before)
-            import streamlit.components.v1 as components
-            
-            # Split HTML into parts to avoid f-string brace escaping issues with CSS/JS
-            d3_html_head = '''
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <script src="https://d3js.org/d3.v7.min.js"></script>
-                <style>
-                    body { margin: 0; overflow: hidden; }
-                    svg { background-color: #ffffff; width: 100vw; height: 100vh; }
-                    .node rect {
-                        stroke: #fff;
-                        stroke-width: 2px;
-                        cursor: pointer;
-                        filter: drop-shadow(0 3px 3px rgba(0,0,0,0.1));
-                        transition: all 0.3s;
-                    }
-                    .node:hover rect {
-                        filter: drop-shadow(0 5px 8px rgba(0,0,0,0.2));
-                        transform: scale(1.02);
-                    }
-                    .node text {
-                        font-family: 'Inter', sans-serif;
-                        font-size: 12px;
-                        pointer-events: none;
-                        alignment-baseline: middle;
-                        font-weight: 500;
-                        fill: #333;
-                    }
-                    .link {
-                        fill: none;
-                        stroke: #cbd5e1;
-                        stroke-width: 1.5px;
-                    }
-                </style>
-            </head>
-            <body>
-                <svg id="mindmap"></svg>
-                <script>
-            '''
-            
-            # Inject data using f-string or formatting
-            d3_data_script = f"const data = {json.dumps(st.session_state.mindmap_data)};"
-            
-            d3_html_body = '''
-                    const width = window.innerWidth;
-                    
-                    // Pastel Color Scale
-                    const colors = ["#e0f2fe", "#f0fdf4", "#fef3c7", "#fce7f3", "#ede9fe"];
-
-                    // Process Data for Hierarchy
-                    const root = d3.hierarchy(data);
-                    
-                    // Dynamic Height Calculation based on leaf nodes
-                    const leaves = root.leaves().length;
-                    const nodeHeight = 60;
-                    const height = Math.max(600, leaves * nodeHeight);
-                    
-                    const svg = d3.select("#mindmap")
-                        .attr("width", width)
-                        .attr("height", height);
-                        
-                    const g = svg.append("g");
-                    
-                    // Zoom behavior
-                    const zoom = d3.zoom()
-                        .scaleExtent([0.1, 4])
-                        .on("zoom", (event) => {
-                            g.attr("transform", event.transform);
-                        });
-                        
-                    svg.call(zoom);
-                    
-                    // Tree Layout
-                    const tree = d3.tree()
-                        .size([height - 100, width - 400]); // Increased horizontal padding
-                        
-                    tree(root);
-                    
-                    // Links
-                    const link = g.selectAll(".link")
-                        .data(root.links())
-                        .join("path")
-                        .attr("class", "link")
-                        .attr("d", d3.linkHorizontal()
-                            .x(d => d.y)
-                            .y(d => d.x));
-                            
-                    // Nodes
-                    const node = g.selectAll(".node")
-                        .data(root.descendants())
-                        .join("g")
-                        .attr("class", "node")
-                        .attr("transform", d => `translate(${d.y},${d.x})`);
-                        
-                    // Node Rectangles
-                    node.append("rect")
-                        .attr("rx", 6)
-                        .attr("ry", 6)
-                        .attr("width", d => Math.max(120, d.data.name.length * 8))
-                        .attr("height", 36)
-                        .attr("y", -18)
-                        .attr("fill", d => {
-                            if (!d.depth) return "#e0e7ff"; // Root
-                            return colors[d.depth % colors.length];
-                        });
-                        
-                    // Node Text
-                    node.append("text")
-                        .attr("dy", 1)
-                        .attr("x", 10)
-                        .text(d => d.data.name);
-                        
-                    // Center the tree initially
-                    const initialScale = 0.8;
-                    const bbox = g.node().getBBox();
-                    const initialTranslate = [
-                        50,
-                        (height - bbox.height * initialScale) / 2 - bbox.y * initialScale
-                    ];
-                    
-                    svg.call(zoom.transform, d3.zoomIdentity
-                        .translate(initialTranslate[0], initialTranslate[1])
-                        .scale(initialScale));
-                        
-                </script>
-            </body>
-            </html>
-            '''
-            
-            # Combine parts
-            d3_html = d3_html_head + d3_data_script + d3_html_body
-            
-            components.html(d3_html, height=600)
+            # D3.js visualization
+            components.html(build_mindmap_html(st.session_state.mindmap_data), height=600)
             
             # Show raw data
             with st.expander("📊 View Tree Data"):
@@ -584,14 +1153,35 @@ else:
     if uploaded_file:
         if st.session_state.filename != uploaded_file.name:
             with st.spinner("📖 Processing Document..."):
-                text = extract_text_from_pdf(uploaded_file)
+                doc_hash = get_doc_hash(uploaded_file)
+                
+                # The summary only reads the first 8000 chars, so start it before the full parse
+                try:
+                    preview = extract_pdf_preview(doc_hash, uploaded_file.getvalue())
+                except Exception:
+                    preview = ""
+                analysis_key, analysis_future = (
+                    prewarm_analysis(preview, doc_hash) if preview.strip() else (None, None)
+                )
+                
+                text, doc_index, index_error = ingest_pdf(uploaded_file, doc_hash)
                 if text:
                     st.session_state.pdf_text = text
                     st.session_state.filename = uploaded_file.name
+                    st.session_state.doc_hash = doc_hash
+                    st.session_state.doc_index = doc_index
+                    # Shown in the Q&A tab, since the rerun below clears any warning issued now
+                    st.session_state.index_error = index_error
+                    st.session_state.q_embeddings = []
+                    st.session_state.q_answers = []
+                    st.session_state.analysis_key = analysis_key
                     st.session_state.summary = None
                     st.session_state.chat_history = []
                     st.session_state.mindmap_data = None
                     st.rerun()
+                elif analysis_future is not None:
+                    # Nothing to show, so don't leave our speculative request running
+                    discard_analysis(analysis_key, analysis_future)
 
     st.markdown("<br><br>", unsafe_allow_html=True)
     